@@ -1,2 +1,4 @@
 export ENV=dev
-export GOOGLE_CLOUD_PROJECT=tbqc-demo
\ No newline at end of file
+export GOOGLE_CLOUD_PROJECT=tbqc-demo
+export GCS_CACHE_DIR=$HOME/.cache/tbqc-demo/gcs
+export GCS_CACHE_MAX_BYTES=2147483648
\ No newline at end of file
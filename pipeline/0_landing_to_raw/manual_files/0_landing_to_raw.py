@@ -20,10 +20,11 @@ sys.path.append(parentdir)
 grandparentdir = os.path.dirname(parentdir)
 sys.path.append(grandparentdir)
 
-from utils.gcs_functions import gcs_delete_list_blobs
+from utils.gcs_functions import gcs_delete_list_blobs, gcs_upload_dataframe_parquet, gcs_read_dataframe_parquet
 from utils.quality_functions import quality_validation_to_gcs, quality_stats_gcs_to_bq
-from utils.gcs_to_bq_functions import gcs_to_bq_load
-from utils.utils_functions import read_file_csv_length
+from utils.gcs_to_bq_functions import gcs_to_bq_load, dataframe_to_bq_load
+from utils.utils_functions import csv_blob_has_rows, csv_file_extension
+from utils.checkpoint_functions import checkpoint_resume_or_start, checkpoint_stage_done, checkpoint_mark_stage, checkpoint_complete, checkpoint_check_workers, checkpoint_job_id
 
 ENV = "dev"
 
@@ -43,6 +44,9 @@ DQ_GCS_DATA_PATH = config.get('data_quality').get('gcs_data_path')
 DQ_GCS_FILE_STATS_FILE_NAME = config.get('data_quality').get('gcs_file_stats_filename')
 DQ_GCS_ROWS_STATS_FILE_NAME = config.get('data_quality').get('gcs_rows_stats_filename')
 DQ_GCS_DATA_INVALID_FILE_NAME = config.get('data_quality').get('gcs_data_invalid_filename')
+DQ_GCS_COMPRESSION = config.get('data_quality').get('gcs_compression')
+DQ_GCS_CHECKPOINT_FILE_NAME = config.get('data_quality').get('gcs_checkpoint_filename')
+csv_file_extension(compression=DQ_GCS_COMPRESSION) # Rejects an unsupported gcs_compression before any file is written
 
 DQ_BQ_PROJECT_ID = config.get('data_quality').get('bq_project_id') + ENV
 DQ_BQ_DATASET_NAME = config.get('data_quality').get('bq_dataset_name')
@@ -50,36 +54,72 @@ DQ_BQ_FILE_STATS_TABLE_NAME = config.get('data_quality').get('bq_file_stats_tabl
 DQ_BQ_ROWS_STATS_TABLE_NAME = config.get('data_quality').get('bq_rows_stats_table_name')
 DQ_BQ_DATA_INVALID_TABLE_NAME = config.get('data_quality').get('bq_data_invalid_table_name')
 
+# Fan-out : the landing blobs are split across SHARD_COUNT workers (e.g. the tasks of a Cloud Run job).
+# Each worker runs the 'validate' stage on its own blobs, then a single 'merge' run loads the outputs of all the workers.
+SHARD_INDEX = int(os.environ.get('SHARD_INDEX', os.environ.get('CLOUD_RUN_TASK_INDEX', 0)))
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', os.environ.get('CLOUD_RUN_TASK_COUNT', 1)))
+PIPELINE_STAGE = os.environ.get('PIPELINE_STAGE', 'validate' if SHARD_COUNT > 1 else 'all')
+PIPELINE_RUN_TS = os.environ.get('PIPELINE_RUN_TS')
+
+if PIPELINE_STAGE not in ['all', 'validate', 'merge']:
+    raise ValueError(f"PIPELINE_STAGE must be 'all', 'validate' or 'merge', not '{PIPELINE_STAGE}'")
+if SHARD_COUNT < 1 or not 0 <= SHARD_INDEX < SHARD_COUNT:
+    raise ValueError(f"SHARD_INDEX must be between 0 and SHARD_COUNT - 1, not {SHARD_INDEX} with SHARD_COUNT {SHARD_COUNT}")
+if SHARD_COUNT > 1 and PIPELINE_STAGE == 'all':
+    raise ValueError("With several workers, PIPELINE_STAGE must be 'validate' for the workers or 'merge' for the final load")
+if SHARD_COUNT > 1 and PIPELINE_STAGE == 'validate' and PIPELINE_RUN_TS is None:
+    raise ValueError("With several workers, PIPELINE_RUN_TS must be set to the execution time shared by all the workers")
+if SHARD_COUNT == 1 and PIPELINE_STAGE in ['validate', 'merge']:
+    raise ValueError(f"PIPELINE_STAGE '{PIPELINE_STAGE}' is only used with several workers : SHARD_COUNT must be set to the number of workers, or PIPELINE_STAGE to 'all'")
+for table in TABLES:
+    data_valid_shard_rows = TABLES.get(table).get('data_valid_shard_rows')
+    if data_valid_shard_rows is not None and (isinstance(data_valid_shard_rows, bool) or not isinstance(data_valid_shard_rows, int) or data_valid_shard_rows <= 0):
+        raise ValueError(f"data_valid_shard_rows of {table} must be a positive integer or null, not '{data_valid_shard_rows}'")
+
 
 # --------------------------------------------------------------------------------
 # Define functions
 # --------------------------------------------------------------------------------
 
-def fun_gcs_data_valid_to_bq(source_project_id, source_bucket_name, source_path, filename, destination_project_id, destination_dataset_name, destination_table_name, schema, write_mode):
-    print(f'----- From project {source_project_id} and bucket {source_bucket_name}, load {source_path}{filename}.csv to BQ {destination_project_id}.{destination_dataset_name}.{destination_table_name} : write_mode {write_mode}-----')
+def fun_gcs_data_valid_to_bq(source_project_id, source_bucket_name, source_path, filename, destination_project_id, destination_dataset_name, destination_table_name, schema, write_mode, compression=None, sharded=False, job_id=None):
+    extension = csv_file_extension(compression=compression)
+    shard_pattern = '-*' if sharded else ''
+    print(f'----- From project {source_project_id} and bucket {source_bucket_name}, load {source_path}{filename}{shard_pattern}{extension} to BQ {destination_project_id}.{destination_dataset_name}.{destination_table_name} : write_mode {write_mode}-----')
     
     source_gcs_client = storage.Client(project=source_project_id)
     source_bucket = source_gcs_client.get_bucket(source_bucket_name)
-    blob = source_bucket.get_blob(f'{source_path}{filename}.csv')
-    blob_data_length = read_file_csv_length(blob, separator=',', encoding='utf-8')
+    # source_path is a list when the outputs of several workers are merged : only the paths having valid lines are loaded
+    source_paths = source_path if isinstance(source_path, list) else [source_path]
+    source_paths_with_data = []
+    for path in source_paths:
+        if sharded:
+            # Shards are only written for non-empty valid data
+            has_data = len(list(source_gcs_client.list_blobs(bucket_or_name=source_bucket_name, prefix=f'{path}{filename}-', max_results=1))) > 0
+        else:
+            # Only the first lines are read : the file itself is loaded by BigQuery from its gs:// URI
+            blob = source_bucket.get_blob(f'{path}{filename}{extension}')
+            has_data = csv_blob_has_rows(blob=blob, compression=compression)
+        if has_data :
+            source_paths_with_data.append(path)
 
-    if blob_data_length > 0 :
+    if len(source_paths_with_data) > 0 :
         gcs_to_bq_load(
             source_project_id=source_project_id, 
             source_bucket_name=source_bucket_name, 
-            source_path=source_path, 
+            source_path=source_paths_with_data if isinstance(source_path, list) else source_path, 
             filename=filename, 
             destination_project_id=destination_project_id,
             destination_dataset_name=destination_dataset_name, 
             destination_table_name=destination_table_name, 
-            file_info={'format':'csv'}, 
+            file_info={'format':'csv', 'compression':compression, 'sharded':sharded}, 
             schema=schema, 
-            write_mode=write_mode
+            write_mode=write_mode,
+            job_id=job_id
         )
     else :
-        print(f"File {source_path}{filename}.csv has no line.")
+        print(f"File {source_path}{filename}{shard_pattern}{extension} has no line.")
 
-    # gcs_delete_list_blobs(project_id=source_project_id, bucket_name=source_bucket_name, source_path=source_path, file_prefix=f'{filename}.csv')
+    # gcs_delete_list_blobs(project_id=source_project_id, bucket_name=source_bucket_name, source_path=source_path, file_prefix=f'{filename}{extension}')
 
 ###### Start of Local Test #######
 
@@ -93,6 +133,8 @@ for table in TABLES :
     destination_bq_dataset_name = TABLES.get(table).get('destination_bq_dataset_name')
     destination_bq_table_name = TABLES.get(table).get('destination_bq_table_name')
     write_mode = TABLES.get(table).get('write_mode')
+    data_valid_shard_rows = TABLES.get(table).get('data_valid_shard_rows')
+    data_valid_load_mode = TABLES.get(table).get('data_valid_load_mode', 'gcs')
 
     if to_request == False :
         print(f'-- Use case {table} has been ignored')
@@ -107,54 +149,148 @@ for table in TABLES :
         bq_schema_df = schema_df[['name', 'type', 'mode']]
         bq_schema_json = bq_schema_df.to_dict(orient='records')
 
-        print('============ DATA QUALITY ============')
         current_date=datetime.now()
         utc_ts = current_date.astimezone(timezone.utc)
         print("utc ingestion date",utc_ts.strftime("%Y-%m-%dT%H:%M:%SZ"))
 
+        run_ts = PIPELINE_RUN_TS or utc_ts.strftime("%Y-%m-%dT%H:%M:%SZ")
 
-        quality_validation_to_gcs(
-            pipeline_name="0_landing_to_raw", 
-            dataset_name=destination_bq_dataset_name,
-            table_name=destination_bq_table_name,        
-            core_landing_project_id=source_gcs_project_id, 
-            core_landing_bucket_name=source_gcs_bucket_name, 
-            core_landing_source_path=params["source_path"], 
-            core_exploitation_project_id=source_gcs_project_id, 
-            core_exploitation_bucket_name=source_gcs_bucket_name, 
-            core_exploitation_dq_stats_path=f'{DQ_GCS_DATA_PATH}/{table}/', 
-            filename_file_stats=DQ_GCS_FILE_STATS_FILE_NAME,
-            filename_rows_stats=DQ_GCS_ROWS_STATS_FILE_NAME,
-            filename_data_invalid=DQ_GCS_DATA_INVALID_FILE_NAME,
-            filename_data_valid=destination_bq_table_name,
-            params=params, 
-            ts=utc_ts.strftime("%Y-%m-%dT%H:%M:%SZ")
-        )
+        # With several workers, each worker writes its outputs in its own folder and the merge loads all the folders
+        dq_gcs_path = f'{DQ_GCS_DATA_PATH}/{table}/'
+        worker_gcs_paths = [f'{dq_gcs_path}workers/{index:05d}/' for index in range(SHARD_COUNT)] if SHARD_COUNT > 1 else [dq_gcs_path]
+        # Valid rows of several workers can only be merged from GCS
+        direct_load = data_valid_load_mode == 'direct' and SHARD_COUNT == 1
+        # Valid rows loaded directly are staged as a Parquet file until they are loaded : a failed load is resumed without a new validation
+        data_valid_parquet_filename = f'{destination_bq_table_name}.parquet'
+        df_data_valid = None
 
-        print('============ GCS DATA QUALITY FILES TO BQ ============')
-        quality_stats_gcs_to_bq(
-            source_project_id=source_gcs_project_id, 
-            source_bucket_name=source_gcs_bucket_name, 
-            source_path=f'{DQ_GCS_DATA_PATH}/{table}/', 
-            filename_file_stats=DQ_GCS_FILE_STATS_FILE_NAME,
-            filename_rows_stats=DQ_GCS_ROWS_STATS_FILE_NAME,
-            filename_data_invalid=DQ_GCS_DATA_INVALID_FILE_NAME,
-            destination_project_id=destination_bq_project_id,
-            destination_dataset_name=DQ_BQ_DATASET_NAME, 
-            destination_table_name_file_stats=DQ_BQ_FILE_STATS_TABLE_NAME, 
-            destination_table_name_rows_stats=DQ_BQ_ROWS_STATS_TABLE_NAME, 
-            destination_table_name_data_invalid=DQ_BQ_DATA_INVALID_TABLE_NAME
-        )
+        if PIPELINE_STAGE in ['all', 'validate']:
+            # A failed run is resumed at its first incomplete stage, with its own execution time.
+            # When PIPELINE_RUN_TS is set, only this run is resumed : an incomplete older run could never be merged with the other workers
+            validation_gcs_path = worker_gcs_paths[SHARD_INDEX]
+            checkpoint_path = f'{validation_gcs_path}{DQ_GCS_CHECKPOINT_FILE_NAME}'
+            checkpoint = checkpoint_resume_or_start(
+                project_id=source_gcs_project_id, 
+                bucket_name=source_gcs_bucket_name, 
+                checkpoint_path=checkpoint_path, 
+                table_name=table, 
+                ts=run_ts,
+                resume_other_run=PIPELINE_RUN_TS is None
+            )
+
+            if not checkpoint_stage_done(checkpoint=checkpoint, stage='quality_validation'):
+                print(f'============ DATA QUALITY : worker {SHARD_INDEX + 1}/{SHARD_COUNT} ============')
+                df_data_valid = quality_validation_to_gcs(
+                    pipeline_name="0_landing_to_raw", 
+                    dataset_name=destination_bq_dataset_name,
+                    table_name=destination_bq_table_name,        
+                    core_landing_project_id=source_gcs_project_id, 
+                    core_landing_bucket_name=source_gcs_bucket_name, 
+                    core_landing_source_path=params["source_path"], 
+                    core_exploitation_project_id=source_gcs_project_id, 
+                    core_exploitation_bucket_name=source_gcs_bucket_name, 
+                    core_exploitation_dq_stats_path=validation_gcs_path, 
+                    filename_file_stats=DQ_GCS_FILE_STATS_FILE_NAME,
+                    filename_rows_stats=DQ_GCS_ROWS_STATS_FILE_NAME,
+                    filename_data_invalid=DQ_GCS_DATA_INVALID_FILE_NAME,
+                    filename_data_valid=destination_bq_table_name,
+                    params=params, 
+                    ts=checkpoint.get('run_id'),
+                    compression=DQ_GCS_COMPRESSION,
+                    shard_rows=data_valid_shard_rows,
+                    write_data_valid=not direct_load,
+                    write_stats=not checkpoint_stage_done(checkpoint=checkpoint, stage='quality_stats'),
+                    shard_index=SHARD_INDEX,
+                    shard_count=SHARD_COUNT
+                )
+                extension = csv_file_extension(compression=DQ_GCS_COMPRESSION)
+                staged_outputs = [f'{validation_gcs_path}{filename}{extension}' for filename in [DQ_GCS_FILE_STATS_FILE_NAME, DQ_GCS_ROWS_STATS_FILE_NAME, DQ_GCS_DATA_INVALID_FILE_NAME]]
+                if direct_load:
+                    gcs_upload_dataframe_parquet(bucket=storage.Client(project=source_gcs_project_id).bucket(source_gcs_bucket_name), blob_name=f'{validation_gcs_path}{data_valid_parquet_filename}', df=df_data_valid)
+                    staged_outputs.append(f'{validation_gcs_path}{data_valid_parquet_filename}')
+                else:
+                    staged_outputs.append(f'{validation_gcs_path}{destination_bq_table_name}-*{extension}' if data_valid_shard_rows else f'{validation_gcs_path}{destination_bq_table_name}{extension}')
+                checkpoint_mark_stage(project_id=source_gcs_project_id, bucket_name=source_gcs_bucket_name, checkpoint_path=checkpoint_path, checkpoint=checkpoint, stage='quality_validation', outputs=staged_outputs)
+
+            if PIPELINE_STAGE == 'validate':
+                checkpoint_complete(project_id=source_gcs_project_id, bucket_name=source_gcs_bucket_name, checkpoint_path=checkpoint_path, checkpoint=checkpoint)
+
+        if PIPELINE_STAGE in ['all', 'merge']:
+            if PIPELINE_STAGE == 'merge':
+                # All the workers must have validated their blobs for the same run
+                merge_run_ts = checkpoint_check_workers(
+                    project_id=source_gcs_project_id, 
+                    bucket_name=source_gcs_bucket_name, 
+                    checkpoint_paths=[f'{path}{DQ_GCS_CHECKPOINT_FILE_NAME}' for path in worker_gcs_paths], 
+                    stage='quality_validation', 
+                    ts=PIPELINE_RUN_TS
+                )
+                checkpoint_path = f'{dq_gcs_path}{DQ_GCS_CHECKPOINT_FILE_NAME}'
+                checkpoint = checkpoint_resume_or_start(
+                    project_id=source_gcs_project_id, 
+                    bucket_name=source_gcs_bucket_name, 
+                    checkpoint_path=checkpoint_path, 
+                    table_name=table, 
+                    ts=merge_run_ts,
+                    resume_other_run=False
+                )
+            loads_source_path = worker_gcs_paths if SHARD_COUNT > 1 else dq_gcs_path
+
+            if not checkpoint_stage_done(checkpoint=checkpoint, stage='quality_stats'):
+                print('============ GCS DATA QUALITY FILES TO BQ ============')
+                quality_stats_gcs_to_bq(
+                    source_project_id=source_gcs_project_id, 
+                    source_bucket_name=source_gcs_bucket_name, 
+                    source_path=loads_source_path, 
+                    filename_file_stats=DQ_GCS_FILE_STATS_FILE_NAME,
+                    filename_rows_stats=DQ_GCS_ROWS_STATS_FILE_NAME,
+                    filename_data_invalid=DQ_GCS_DATA_INVALID_FILE_NAME,
+                    destination_project_id=destination_bq_project_id,
+                    destination_dataset_name=DQ_BQ_DATASET_NAME, 
+                    destination_table_name_file_stats=DQ_BQ_FILE_STATS_TABLE_NAME, 
+                    destination_table_name_rows_stats=DQ_BQ_ROWS_STATS_TABLE_NAME, 
+                    destination_table_name_data_invalid=DQ_BQ_DATA_INVALID_TABLE_NAME,
+                    compression=DQ_GCS_COMPRESSION,
+                    job_id_prefix=checkpoint_job_id(checkpoint=checkpoint, stage='quality_stats')
+                )
+                checkpoint_mark_stage(project_id=source_gcs_project_id, bucket_name=source_gcs_bucket_name, checkpoint_path=checkpoint_path, checkpoint=checkpoint, stage='quality_stats')
+
+            if not checkpoint_stage_done(checkpoint=checkpoint, stage='data_valid'):
+                if direct_load:
+                    print('============ DATA VALID TO BQ ============')
+                    if df_data_valid is None:
+                        print(f'Resume the load of the valid rows staged in {dq_gcs_path}{data_valid_parquet_filename}')
+                        df_data_valid = gcs_read_dataframe_parquet(bucket=storage.Client(project=source_gcs_project_id).bucket(source_gcs_bucket_name), blob_name=f'{dq_gcs_path}{data_valid_parquet_filename}')
+                    if df_data_valid.shape[0] > 0 :
+                        dataframe_to_bq_load(
+                            df=df_data_valid, 
+                            destination_project_id=destination_bq_project_id,
+                            destination_dataset_name=destination_bq_dataset_name, 
+                            destination_table_name=destination_bq_table_name, 
+                            schema=params.get('schema'), 
+                            write_mode=write_mode,
+                            job_id=checkpoint_job_id(checkpoint=checkpoint, stage='data_valid')
+                        )
+                    else :
+                        print(f"Table {table} has no valid line.")
+                else :
+                    print('============ GCS DATA VALID TO BQ ============')
+                    fun_gcs_data_valid_to_bq(
+                        source_project_id=source_gcs_bucket_name, 
+                        source_bucket_name=source_gcs_bucket_name, 
+                        source_path=loads_source_path, 
+                        filename=destination_bq_table_name, 
+                        destination_project_id=destination_bq_project_id,
+                        destination_dataset_name=destination_bq_dataset_name, 
+                        destination_table_name=destination_bq_table_name, 
+                        schema=params.get('schema'), 
+                        write_mode=write_mode,
+                        compression=DQ_GCS_COMPRESSION,
+                        sharded=bool(data_valid_shard_rows),
+                        job_id=checkpoint_job_id(checkpoint=checkpoint, stage='data_valid')
+                    )
+                checkpoint_mark_stage(project_id=source_gcs_project_id, bucket_name=source_gcs_bucket_name, checkpoint_path=checkpoint_path, checkpoint=checkpoint, stage='data_valid')
+                if direct_load:
+                    gcs_delete_list_blobs(project_id=source_gcs_project_id, bucket_name=source_gcs_bucket_name, source_path=dq_gcs_path, file_prefix=data_valid_parquet_filename)
 
-        print('============ GCS DATA VALID TO BQ ============')
-        fun_gcs_data_valid_to_bq(
-            source_project_id=source_gcs_bucket_name, 
-            source_bucket_name=source_gcs_bucket_name, 
-            source_path=f'{DQ_GCS_DATA_PATH}/{table}/', 
-            filename=destination_bq_table_name, 
-            destination_project_id=destination_bq_project_id,
-            destination_dataset_name=destination_bq_dataset_name, 
-            destination_table_name=destination_bq_table_name, 
-            schema=params.get('schema'), 
-            write_mode=write_mode
-        )
\ No newline at end of file
+            checkpoint_complete(project_id=source_gcs_project_id, bucket_name=source_gcs_bucket_name, checkpoint_path=checkpoint_path, checkpoint=checkpoint)
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+This script compares the parsing of check_rows_parsing before the parser kernels (chained str.replace + to_numeric / to_datetime)
+with the kernels of utils.parser_functions, on generated INTEGER, FLOAT and DATE columns.
+Usage : python pipeline/benchmarks/parser_benchmark.py [nb_rows]
+""" 
+
+import os, sys
+import timeit
+import numpy as np
+import pandas as pd
+
+currentdir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.dirname(currentdir))
+
+from utils.parser_functions import parse_integer_column, parse_float_column, parse_date_column
+
+
+def legacy_integer(values):
+    values = values.fillna('0')
+    values = values.str.replace(pat='^[0-9]*[.,][1-9]+$', repl="ERROR_COMMA", regex=True)
+    return pd.to_numeric(values, errors='coerce', downcast="integer")
+
+
+def legacy_float(values, thousand_separator, decimal_separator):
+    values = values.fillna('0')
+    values = values.str.replace(thousand_separator, '', regex=False)
+    values = values.str.replace(decimal_separator, '.', regex=False)
+    return pd.to_numeric(values, errors='coerce', downcast="float")
+
+
+def legacy_date(values, date_format):
+    values = values.fillna('1900-01-01')
+    return pd.to_datetime(values, format=date_format, errors='coerce')
+
+
+nb_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+rng = np.random.default_rng(0)
+integers = pd.Series(rng.integers(0, 10**6, nb_rows).astype(str), dtype=object)
+floats = pd.Series([f'{value:,.2f}'.replace(',', ' ').replace('.', ',') for value in rng.uniform(0, 10**6, nb_rows)], dtype=object)
+dates = pd.Series(pd.to_datetime(rng.integers(0, 10**9, nb_rows), unit='s').strftime('%d/%m/%Y'), dtype=object)
+
+benchmarks = [
+    ('INTEGER', lambda: legacy_integer(integers), lambda: parse_integer_column(integers)),
+    ('FLOAT', lambda: legacy_float(floats, ' ', ','), lambda: parse_float_column(floats, ' ', ',')),
+    ('DATE', lambda: legacy_date(dates, '%d/%m/%Y'), lambda: parse_date_column(dates, '%d/%m/%Y')),
+]
+for col_type, legacy, kernel in benchmarks:
+    legacy_time = min(timeit.repeat(legacy, number=1, repeat=3))
+    kernel_time = min(timeit.repeat(kernel, number=1, repeat=3))
+    print(f'{col_type:<8} {nb_rows} rows | legacy : {legacy_time:.3f}s | kernel : {kernel_time:.3f}s | x{legacy_time / kernel_time:.2f}')
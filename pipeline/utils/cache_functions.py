@@ -0,0 +1,100 @@
+import hashlib
+import io
+import os
+
+# The cache is only enabled when GCS_CACHE_DIR is set : on Cloud Run, the temporary directory is in memory
+GCS_CACHE_DIR = os.environ.get('GCS_CACHE_DIR')
+GCS_CACHE_MAX_BYTES = int(os.environ.get('GCS_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+
+
+def gcs_cache_evict(cache_dir:str, max_bytes:int, keep_path:str=None):
+    """
+    Remove the least recently used files of the cache until its size is below max_bytes.
+    Several processes can share the cache directory : a file removed by another process is ignored.
+    Entries :
+        - cache_dir                   (string, required): The cache directory
+        - max_bytes                   (int, required): The maximum size of the cache, in bytes
+        - keep_path                   (string, optional): A cached file that must not be removed
+    """
+    cached_files = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.tmp'):
+            continue
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        cached_files.append((stat.st_mtime, stat.st_size, entry.path))
+    cached_files.sort()
+    cache_size = sum(size for _, size, _ in cached_files)
+    for _, size, path in cached_files:
+        if cache_size <= max_bytes:
+            break
+        if path == keep_path:
+            continue
+        cache_size -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def gcs_download_cached(blob, cache_dir:str=None, max_bytes:int=None) -> io.IOBase:
+    """
+    Download a blob into the local disk cache and return the cached file, opened.
+    The cache is keyed by bucket, name and generation : a new generation of an object is always downloaded again.
+    The file is opened before it can be evicted, so another process sharing the cache can not remove it while it is read.
+    Entries :
+        - blob                        (blob, required): Blob object
+        - cache_dir                   (string, optional): The cache directory. Default GCS_CACHE_DIR. If NULL, the cache is disabled
+        - max_bytes                   (int, optional): The maximum size of the cache, in bytes. Default GCS_CACHE_MAX_BYTES
+    Return :
+        - file                        Binary file object of the cached file, or in-memory file object with the blob content if the cache is disabled. To be closed by the caller
+    """
+    cache_dir = cache_dir or GCS_CACHE_DIR
+    max_bytes = max_bytes or GCS_CACHE_MAX_BYTES
+    if not cache_dir:
+        return io.BytesIO(blob.download_as_bytes())
+    os.makedirs(cache_dir, exist_ok=True)
+
+    if blob.generation is None:
+        blob.reload()
+    cache_key = hashlib.sha256(f'{blob.bucket.name}/{blob.name}#{blob.generation}'.encode('utf-8')).hexdigest()
+    path = os.path.join(cache_dir, f'{cache_key}{os.path.splitext(blob.name)[1]}')
+
+    try:
+        cached_file = open(path, mode='rb')
+        print(f'Read {blob.name} (generation {blob.generation}) from cache : {path}')
+        os.utime(path) # Mark as recently used
+        return cached_file
+    except FileNotFoundError:
+        pass # Not cached, or evicted by another process
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        blob.download_to_filename(tmp_path, if_generation_match=blob.generation)
+        cached_file = open(tmp_path, mode='rb')
+        os.replace(tmp_path, path)
+    except Exception:
+        # e.g. the object was overwritten since it was listed : the partial download is not kept
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    gcs_cache_evict(cache_dir=cache_dir, max_bytes=max_bytes, keep_path=path)
+
+    return cached_file
+
+
+def gcs_open_stream(blob, cache_dir:str=None, max_bytes:int=None) -> io.IOBase:
+    """
+    Open a blob to be read sequentially : from the local disk cache if it is enabled, else streamed from GCS without a full download.
+    Entries :
+        - blob                        (blob, required): Blob object
+        - cache_dir                   (string, optional): The cache directory. Default GCS_CACHE_DIR. If NULL, the cache is disabled
+        - max_bytes                   (int, optional): The maximum size of the cache, in bytes. Default GCS_CACHE_MAX_BYTES
+    Return :
+        - file                        Binary file object, to be closed by the caller
+    """
+    if cache_dir or GCS_CACHE_DIR:
+        return gcs_download_cached(blob=blob, cache_dir=cache_dir, max_bytes=max_bytes)
+    return blob.open(mode='rb')
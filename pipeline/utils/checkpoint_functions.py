@@ -0,0 +1,137 @@
+from google.cloud import storage
+import datetime
+import json
+import re
+
+
+def checkpoint_read(project_id:str, bucket_name:str, checkpoint_path:str) -> dict:
+    """
+    Read a run checkpoint stored as a JSON blob.
+    Entries :
+        - project_id                  (string, required): The project identifier
+        - bucket_name                 (string, required): The bucket name storing the checkpoint
+        - checkpoint_path             (string, required): The checkpoint object name
+    Return :
+        - checkpoint                  The checkpoint record, or None if there is no checkpoint
+    """
+    gcs_client = storage.Client(project=project_id)
+    blob = gcs_client.bucket(bucket_name=bucket_name).get_blob(checkpoint_path)
+    if blob is None:
+        return None
+    return json.loads(blob.download_as_bytes())
+
+
+def checkpoint_write(project_id:str, bucket_name:str, checkpoint_path:str, checkpoint:dict):
+    """
+    Write a run checkpoint as a JSON blob.
+    Entries :
+        - project_id                  (string, required): The project identifier
+        - bucket_name                 (string, required): The bucket name storing the checkpoint
+        - checkpoint_path             (string, required): The checkpoint object name
+        - checkpoint                  (dict, required): The checkpoint record
+    """
+    gcs_client = storage.Client(project=project_id)
+    blob = gcs_client.bucket(bucket_name=bucket_name).blob(blob_name=checkpoint_path)
+    blob.upload_from_string(data=json.dumps(checkpoint, indent=2), content_type='application/json')
+
+
+def checkpoint_resume_or_start(project_id:str, bucket_name:str, checkpoint_path:str, table_name:str, ts:str, resume_other_run:bool=True) -> dict:
+    """
+    Resume the run ts or the incomplete run of a table if its checkpoint exists, else start a new run.
+    Entries :
+        - project_id                  (string, required): The project identifier
+        - bucket_name                 (string, required): The bucket name storing the checkpoint
+        - checkpoint_path             (string, required): The checkpoint object name
+        - table_name                  (string, required): Name of the table
+        - ts                          (string, required): Execution time of the new run
+        - resume_other_run            (bool, optional): If False, an incomplete run with another execution time is not resumed. Default True
+    Return :
+        - checkpoint                  The checkpoint record : table, run_id (execution time of the run), completed, stages {stage: {done_at, outputs}}
+    """
+    checkpoint = checkpoint_read(project_id=project_id, bucket_name=bucket_name, checkpoint_path=checkpoint_path)
+    if checkpoint and (checkpoint.get('run_id') == ts or (resume_other_run and not checkpoint.get('completed'))):
+        print(f"Resume run {checkpoint.get('run_id')} of {table_name}, completed stages : {list(checkpoint.get('stages'))}")
+        return checkpoint
+
+    checkpoint = {
+        'table': table_name,
+        'run_id': ts,
+        'completed': False,
+        'stages': {}
+    }
+    checkpoint_write(project_id=project_id, bucket_name=bucket_name, checkpoint_path=checkpoint_path, checkpoint=checkpoint)
+    print(f"Start run {ts} of {table_name}")
+    return checkpoint
+
+
+def checkpoint_stage_done(checkpoint:dict, stage:str) -> bool:
+    """
+    Check if a stage of the run is completed.
+    Entries :
+        - checkpoint                  (dict, required): The checkpoint record
+        - stage                       (string, required): The stage name
+    """
+    return stage in checkpoint.get('stages')
+
+
+def checkpoint_mark_stage(project_id:str, bucket_name:str, checkpoint_path:str, checkpoint:dict, stage:str, outputs:list=None):
+    """
+    Mark a stage of the run as completed, with its staged outputs, and persist the checkpoint.
+    Entries :
+        - project_id                  (string, required): The project identifier
+        - bucket_name                 (string, required): The bucket name storing the checkpoint
+        - checkpoint_path             (string, required): The checkpoint object name
+        - checkpoint                  (dict, required): The checkpoint record
+        - stage                       (string, required): The stage name
+        - outputs                     (list, optional): The object names staged by the stage
+    """
+    checkpoint.get('stages')[stage] = {
+        'done_at': str(datetime.datetime.now(datetime.timezone.utc)),
+        'outputs': outputs or []
+    }
+    checkpoint_write(project_id=project_id, bucket_name=bucket_name, checkpoint_path=checkpoint_path, checkpoint=checkpoint)
+
+
+def checkpoint_complete(project_id:str, bucket_name:str, checkpoint_path:str, checkpoint:dict):
+    """
+    Mark the run as completed : the next execution starts a new run.
+    Entries :
+        - project_id                  (string, required): The project identifier
+        - bucket_name                 (string, required): The bucket name storing the checkpoint
+        - checkpoint_path             (string, required): The checkpoint object name
+        - checkpoint                  (dict, required): The checkpoint record
+    """
+    checkpoint['completed'] = True
+    checkpoint_write(project_id=project_id, bucket_name=bucket_name, checkpoint_path=checkpoint_path, checkpoint=checkpoint)
+
+
+def checkpoint_check_workers(project_id:str, bucket_name:str, checkpoint_paths:list, stage:str, ts:str=None) -> str:
+    """
+    Check that a stage is completed by all the workers of a run, before merging their outputs.
+    Entries :
+        - project_id                  (string, required): The project identifier
+        - bucket_name                 (string, required): The bucket name storing the checkpoints
+        - checkpoint_paths            (list, required): The checkpoint object names of all the workers
+        - stage                       (string, required): The stage name
+        - ts                          (string, optional): Execution time of the run. If NULL, the run of the first worker
+    Return :
+        - run_id                      The execution time of the run shared by all the workers
+    """
+    for checkpoint_path in checkpoint_paths:
+        checkpoint = checkpoint_read(project_id=project_id, bucket_name=bucket_name, checkpoint_path=checkpoint_path)
+        if checkpoint is None or not checkpoint_stage_done(checkpoint=checkpoint, stage=stage):
+            raise RuntimeError(f'Worker checkpoint {checkpoint_path} has not completed the stage {stage}')
+        ts = ts or checkpoint.get('run_id')
+        if checkpoint.get('run_id') != ts:
+            raise RuntimeError(f"Worker checkpoint {checkpoint_path} belongs to the run {checkpoint.get('run_id')}, not to the run {ts}")
+    return ts
+
+
+def checkpoint_job_id(checkpoint:dict, stage:str) -> str:
+    """
+    Build the deterministic BigQuery load job identifier of a stage of the run.
+    Entries :
+        - checkpoint                  (dict, required): The checkpoint record
+        - stage                       (string, required): The stage name
+    """
+    return re.sub(r'[^a-zA-Z0-9_-]', '_', f"{checkpoint.get('table')}_{checkpoint.get('run_id')}_{stage}")
@@ -1,4 +1,9 @@
 from google.cloud import storage
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import io
+import pandas as pd
+from utils.utils_functions import csv_file_extension
 
 def gcs_delete_list_blobs(project_id:str, bucket_name:str, source_path:str, file_prefix:str=None):
     """
@@ -15,4 +20,92 @@ def gcs_delete_list_blobs(project_id:str, bucket_name:str, source_path:str, file
     for blob in blobs:
         if blob.size > 0 : # Check if a file is inside the folder
             print(f"Delete Blob in bucket {bucket_name} from project {project_id}: {blob.name}")
-            blob.delete()
\ No newline at end of file
+            blob.delete()
+
+
+def gcs_upload_dataframe_csv(bucket, blob_name:str, df, separator:str=';', compression:str=None, chunk_rows:int=100000):
+    """
+    Write a dataframe into a blob as a CSV file, through a resumable streaming upload.
+    The dataframe is serialized chunk by chunk, so the full CSV string is never held in memory.
+    Entries :
+        - bucket                      (bucket, required): The destination bucket object
+        - blob_name                   (string, required): The destination object name
+        - df                          (dataframe, required): The dataframe to write
+        - separator                   (string, optional): The CSV separator. Default ';'
+        - compression                 (string, optional): 'gzip' to compress the object. If NULL, the object is not compressed.
+        - chunk_rows                  (int, optional): Number of rows serialized per chunk
+    """
+    csv_file_extension(compression=compression) # Rejects the unsupported compressions
+    blob = bucket.blob(blob_name=blob_name)
+    content_type = 'application/gzip' if compression == 'gzip' else 'text/csv'
+
+    with blob.open(mode='wb', content_type=content_type, ignore_flush=True) as blob_file:
+        file_obj = gzip.GzipFile(fileobj=blob_file, mode='wb') if compression == 'gzip' else blob_file
+        if df.shape[0] == 0:
+            file_obj.write(df.to_csv(sep=separator, index=False).encode('utf-8'))
+        for start in range(0, df.shape[0], chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows]
+            file_obj.write(chunk.to_csv(sep=separator, index=False, header=(start == 0)).encode('utf-8'))
+        if compression == 'gzip':
+            file_obj.close()
+
+
+def gcs_upload_dataframe_csv_shards(bucket, blob_name_prefix:str, df, shard_rows:int, separator:str=';', compression:str=None, max_workers:int=8) -> list:
+    """
+    Write a dataframe into several CSV blobs of at most shard_rows rows, uploaded in parallel.
+    Shards are named {blob_name_prefix}-000000{extension}, {blob_name_prefix}-000001{extension}, ... and each one has a header line.
+    No shard is written if the dataframe is empty.
+    Entries :
+        - bucket                      (bucket, required): The destination bucket object
+        - blob_name_prefix            (string, required): The destination object name, without extension
+        - df                          (dataframe, required): The dataframe to write
+        - shard_rows                  (int, required): Maximum number of rows per shard
+        - separator                   (string, optional): The CSV separator. Default ';'
+        - compression                 (string, optional): 'gzip' to compress the shards. If NULL, the shards are not compressed.
+        - max_workers                 (int, optional): Maximum number of parallel uploads
+    Return :
+        - blob_names                  The list of the written object names
+    """
+    if isinstance(shard_rows, bool) or not isinstance(shard_rows, int) or shard_rows <= 0:
+        raise ValueError(f"shard_rows must be a positive integer, not '{shard_rows}'")
+    extension = csv_file_extension(compression=compression)
+    shards = [(f'{blob_name_prefix}-{index:06d}{extension}', df.iloc[start:start + shard_rows]) for index, start in enumerate(range(0, df.shape[0], shard_rows))]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(gcs_upload_dataframe_csv, bucket=bucket, blob_name=blob_name, df=df_shard, separator=separator, compression=compression) for blob_name, df_shard in shards]
+        for future in futures:
+            future.result() # Raise the upload errors
+
+    return [blob_name for blob_name, _ in shards]
+
+
+def gcs_upload_dataframe_parquet(bucket, blob_name:str, df):
+    """
+    Write a dataframe into a blob as a Parquet file, through a resumable streaming upload.
+    Object columns holding other values than strings (e.g. numbers and strings read from JSON files) are written as strings.
+    Entries :
+        - bucket                      (bucket, required): The destination bucket object
+        - blob_name                   (string, required): The destination object name
+        - df                          (dataframe, required): The dataframe to write
+    """
+    df = df.copy()
+    for col_name in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col_name], skipna=True) not in ['string', 'empty']:
+            df[col_name] = df[col_name].astype(str).where(df[col_name].notna())
+
+    blob = bucket.blob(blob_name=blob_name)
+    with blob.open(mode='wb', content_type='application/vnd.apache.parquet', ignore_flush=True) as blob_file:
+        df.to_parquet(blob_file)
+
+
+def gcs_read_dataframe_parquet(bucket, blob_name:str):
+    """
+    Read a Parquet blob into a dataframe.
+    Entries :
+        - bucket                      (bucket, required): The source bucket object
+        - blob_name                   (string, required): The source object name
+    Return :
+        - df                          The dataframe
+    """
+    blob = bucket.blob(blob_name=blob_name)
+    return pd.read_parquet(io.BytesIO(blob.download_as_bytes()))
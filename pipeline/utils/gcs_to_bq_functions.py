@@ -1,22 +1,53 @@
 from google.cloud import bigquery, storage
+from google.api_core.exceptions import NotFound
 import io
-from utils.utils_functions import excel_file_to_csv_string
+from utils.utils_functions import excel_file_to_csv_string, csv_file_extension, cast_dataframe_to_schema
 
 
-def gcs_to_bq_load(source_project_id:str, source_bucket_name:str, source_path:str, destination_dataset_name: str, destination_table_name:str, filename:str, file_info:dict, schema:list, write_mode:str, destination_project_id:str=None):
+def bq_find_load_job(bq_client, job_id:str, location:str=None):
+    """
+    Find the first free or successful load job identifier derived from job_id : {job_id}_0, {job_id}_1, ...
+    A deterministic job identifier makes a load idempotent : a job that already succeeded is never run again.
+    Entries :
+        - bq_client                   (client, required): The BigQuery client
+        - job_id                      (string, required): The base job identifier
+        - location                    (string, optional): The location of the jobs, which is the location of the destination dataset
+    Return :
+        - job_id                      The job identifier to use
+        - job                         The successful job if the load has already been done, else None
+    """
+    attempt = 0
+    while True:
+        attempt_job_id = f'{job_id}_{attempt}'
+        try:
+            job = bq_client.get_job(attempt_job_id, location=location)
+        except NotFound:
+            return attempt_job_id, None
+        if job.state != 'DONE':
+            try:
+                job.result() # Waits for a job started by a previous attempt
+            except Exception as e:
+                print(f'Load job {attempt_job_id} failed : {e}')
+        if job.error_result is None:
+            return attempt_job_id, job
+        attempt += 1
+
+
+def gcs_to_bq_load(source_project_id:str, source_bucket_name:str, source_path, destination_dataset_name: str, destination_table_name:str, filename:str, file_info:dict, schema:list, write_mode:str, destination_project_id:str=None, job_id:str=None):
     """
     Load file from a bucket to destination dataset table.
     Entries :
         - source_project_id           (string, required): The destination project identifier
         - source_bucket_name          (string, required): The destination bucket name
-        - source_path                 (string, required): The source object path 
+        - source_path                 (string or list, required): The source object path. For csv files, a list of paths is loaded in a single load job
         - destination_dataset_name    (string, required): The BigQuery dataset to load data into
         - destination_table_name      (string, required): The BigQuery table to load data into
         - filename                    (string, required): The filename to load
-        - file_info                   (dict, required): The file information
+        - file_info                   (dict, required): The file information. For csv files, 'compression' can be set to 'gzip' and 'sharded' to True to load all the {filename}-* shards
         - schema                      (list, required): The schema field list
         - write_mode                  (string, required): The write mode to BigQuery
         - destination_project_id      (string, optional): The source project identifier. If NULL, the same as destination project id
+        - job_id                      (string, optional): Deterministic load job identifier. If the load has already succeeded with this identifier, it is skipped
     """
     gcs_client_source = storage.Client(project=source_project_id)
     bucket_source = gcs_client_source.bucket(bucket_name=source_bucket_name)
@@ -30,6 +61,13 @@ def gcs_to_bq_load(source_project_id:str, source_bucket_name:str, source_path:st
         write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
 
 
+    if job_id:
+        location = bq_client.get_dataset(f'{table_id.rsplit(".", 1)[0]}').location
+        job_id, done_job = bq_find_load_job(bq_client=bq_client, job_id=job_id, location=location)
+        if done_job:
+            print(f'Load job {job_id} to {table_id} already done, skipped.')
+            return
+
     format = file_info.get('format')
     if format == 'csv' or format == "xlsx":
         
@@ -41,22 +79,81 @@ def gcs_to_bq_load(source_project_id:str, source_bucket_name:str, source_path:st
             skip_leading_rows=1,
             write_disposition=write_disposition
         )
-        if format == 'csv':
-            blob = bucket_source.blob(blob_name=f'{source_path}{filename}.csv')
-            csv_content = blob.download_as_string()
-        elif format == "xlsx":
-            csv_content = excel_file_to_csv_string(
-                project_id=source_project_id, 
-                bucket_name=source_bucket_name, 
-                source_path=source_path, 
-                file_info=file_info, 
-                filename=filename
-            ).encode('utf-8')
-
-        load_job = bq_client.load_table_from_file(
-            file_obj=io.BytesIO(csv_content), 
-            destination=table_id, 
-            job_config=job_config
-        ) # Make an API request
+        if format == 'csv' and (file_info.get('compression') or file_info.get('sharded') or isinstance(source_path, list)):
+            # Compressed, sharded or multiple objects are loaded by BigQuery directly from GCS, without download
+            shard_pattern = '-*' if file_info.get('sharded') else ''
+            source_paths = source_path if isinstance(source_path, list) else [source_path]
+            source_uris = [f'gs://{source_bucket_name}/{path}{filename}{shard_pattern}{csv_file_extension(file_info.get("compression"))}' for path in source_paths]
+            load_job = bq_client.load_table_from_uri(
+                source_uris=source_uris, 
+                destination=table_id, 
+                job_config=job_config,
+                job_id=job_id
+            ) # Make an API request
+        else:
+            if format == 'csv':
+                blob = bucket_source.blob(blob_name=f'{source_path}{filename}.csv')
+                csv_content = blob.download_as_string()
+            elif format == "xlsx":
+                csv_content = excel_file_to_csv_string(
+                    project_id=source_project_id, 
+                    bucket_name=source_bucket_name, 
+                    source_path=source_path, 
+                    file_info=file_info, 
+                    filename=filename
+                ).encode('utf-8')
+
+            load_job = bq_client.load_table_from_file(
+                file_obj=io.BytesIO(csv_content), 
+                destination=table_id, 
+                job_config=job_config,
+                job_id=job_id
+            ) # Make an API request
         load_job.result() # Waits for the job to complete
-        print(f'Successfully loaded rows.')
\ No newline at end of file
+        print(f'Successfully loaded rows.')
+
+
+def dataframe_to_bq_load(df, destination_project_id:str, destination_dataset_name:str, destination_table_name:str, schema:list, write_mode:str, job_id:str=None):
+    """
+    Load a dataframe straight into a destination dataset table, as a typed columnar payload, without GCS staging.
+    Entries :
+        - df                          (dataframe, required): The dataframe to load
+        - destination_project_id      (string, required): The destination project identifier
+        - destination_dataset_name    (string, required): The BigQuery dataset to load data into
+        - destination_table_name      (string, required): The BigQuery table to load data into
+        - schema                      (list, required): The schema field list, with the parsing information (date_format, float separators)
+        - write_mode                  (string, required): The write mode to BigQuery
+        - job_id                      (string, optional): Deterministic load job identifier. If the load has already succeeded with this identifier, it is skipped
+    """
+    bq_client = bigquery.Client(project=destination_project_id)
+    table_id = f'{destination_project_id}.{destination_dataset_name}.{destination_table_name}'
+
+    if job_id:
+        location = bq_client.get_dataset(f'{table_id.rsplit(".", 1)[0]}').location
+        job_id, done_job = bq_find_load_job(bq_client=bq_client, job_id=job_id, location=location)
+        if done_job:
+            print(f'Load job {job_id} to {table_id} already done, skipped.')
+            return
+
+    if write_mode=='APPEND':
+        write_disposition = bigquery.WriteDisposition.WRITE_APPEND
+    if write_mode=='TRUNCATE':
+        write_disposition = bigquery.WriteDisposition.WRITE_TRUNCATE
+
+    bq_schema = [bigquery.SchemaField(name=col_info['name'], field_type=col_info['type'], mode=col_info.get('mode', 'NULLABLE')) for col_info in schema]
+    job_config = bigquery.LoadJobConfig(
+        create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
+        schema=bq_schema,
+        source_format=bigquery.SourceFormat.PARQUET,
+        write_disposition=write_disposition
+    )
+
+    df_typed = cast_dataframe_to_schema(df=df[[col_info['name'] for col_info in schema]], schema=schema)
+    load_job = bq_client.load_table_from_dataframe(
+        dataframe=df_typed, 
+        destination=table_id, 
+        job_config=job_config,
+        job_id=job_id
+    ) # Make an API request
+    load_job.result() # Waits for the job to complete
+    print(f'Successfully loaded {df_typed.shape[0]} rows.')
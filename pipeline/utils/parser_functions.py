@@ -0,0 +1,98 @@
+import re
+import numpy as np
+import pandas as pd
+
+INT64_MIN = -2**63
+INT64_MAX = 2**63 - 1
+
+
+def parse_integer_column(values):
+    """
+    Parse a string column into integers, in a single vectorized pass.
+    A value is not parsable if it is not numeric, if it has a non-zero decimal part (10.0 is parsable, 10.1 is not) or if it does not fit in INT64. NULL values are parsable.
+    Integers above 2^53, which float64 can not hold exactly, are converted from their text.
+    Entries :
+    - values                           (series, required): The string column
+    Return :
+    - parsed                           series : the parsed values (Int64, NULL for NULL and not parsable values)
+    - failed                           series : boolean mask of the not parsable values
+    """
+    numeric = pd.to_numeric(values, errors='coerce')
+    failed = (values.notna() & (numeric.isna() | (numeric % 1 != 0))).to_numpy(dtype=bool, copy=True)
+    numeric = numeric.to_numpy(dtype='float64', na_value=np.nan)
+
+    parsed = np.zeros(len(values), dtype='int64')
+    is_parsed = ~np.isnan(numeric) & ~failed
+    # Below 2^53, the float64 value of an integer is exact
+    is_exact = is_parsed & (np.abs(numeric) < 2**53)
+    parsed[is_exact] = numeric[is_exact].astype('int64')
+    # Above, the integer is converted from its text (10.0 is read as 10), or from its float64 value for other notations (e.g. 1e20)
+    for position in np.flatnonzero(is_parsed & ~is_exact):
+        text = re.sub(r'\.0*$', '', str(values.iloc[position]).strip())
+        value = int(text) if re.fullmatch(r'[+-]?[0-9]+', text) else int(numeric[position])
+        if INT64_MIN <= value <= INT64_MAX:
+            parsed[position] = value
+        else:
+            failed[position] = True
+            is_parsed[position] = False
+
+    return pd.Series(pd.arrays.IntegerArray(parsed, ~is_parsed), index=values.index), pd.Series(failed, index=values.index)
+
+
+def parse_float_column(values, thousand_separator:str=None, decimal_separator:str=None):
+    """
+    Parse a string column into floats, using the literal (not regex) thousand and decimal separators of the schema. NULL values are parsable.
+    Entries :
+    - values                           (series, required): The string column
+    - thousand_separator               (str, optional): The thousand separator, removed before parsing
+    - decimal_separator                (str, optional): The decimal separator, replaced by '.' before parsing
+    Return :
+    - parsed                           series : the parsed values (float64)
+    - failed                           series : boolean mask of the not parsable values
+    """
+    if thousand_separator != None or decimal_separator != None:
+        # Numbers read from JSON files are not strings
+        if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+            values = values.astype(str).where(values.notna())
+        if thousand_separator != None:
+            values = values.str.replace(thousand_separator, '', regex=False)
+        if decimal_separator != None:
+            values = values.str.replace(decimal_separator, '.', regex=False)
+    parsed = pd.to_numeric(values, errors='coerce').astype('float64')
+    failed = values.notna() & parsed.isna()
+    return parsed, failed
+
+
+def parse_date_column(values, date_format:str=None):
+    """
+    Parse a string column into dates or datetimes, using the date format of the schema. NULL values are parsable.
+    Entries :
+    - values                           (series, required): The string column
+    - date_format                      (str, optional): The date format, e.g. %Y-%m-%d. If NULL, the format is inferred
+    Return :
+    - parsed                           series : the parsed values (datetime64)
+    - failed                           series : boolean mask of the not parsable values
+    """
+    parsed = pd.to_datetime(values, format=date_format, errors='coerce')
+    failed = values.notna() & parsed.isna()
+    return parsed, failed
+
+
+def parse_column(values, col_info:dict):
+    """
+    Parse a string column into the type of its schema definition : INTEGER, FLOAT / FLOAT64, DATE / DATETIME. STRING columns are always parsable.
+    Entries :
+    - values                           (series, required): The string column
+    - col_info                         (dict, required): The column schema : type, date_format, float_thousand_separator, float_decimal_separator
+    Return :
+    - parsed                           series : the parsed values
+    - failed                           series : boolean mask of the not parsable values
+    """
+    col_type = col_info.get('type')
+    if col_type == 'INTEGER':
+        return parse_integer_column(values=values)
+    if (col_type == 'FLOAT64') or (col_type == 'FLOAT'):
+        return parse_float_column(values=values, thousand_separator=col_info.get('float_thousand_separator'), decimal_separator=col_info.get('float_decimal_separator'))
+    if (col_type == 'DATE') or (col_type == 'DATETIME'):
+        return parse_date_column(values=values, date_format=col_info.get('date_format'))
+    return values, pd.Series(False, index=values.index)
@@ -1,14 +1,14 @@
 import logging
 import pandas as pd
-import io
-import os
 import re
 import datetime
 import json
 import ast
 from google.cloud import storage
-from utils.gcs_functions import gcs_delete_list_blobs
+from utils.gcs_functions import gcs_delete_list_blobs, gcs_upload_dataframe_csv, gcs_upload_dataframe_csv_shards
 from utils.gcs_to_bq_functions import gcs_to_bq_load
+from utils.utils_functions import csv_file_extension, blob_shard_index, landing_file_sources, landing_source_read, concat_dataframes
+from utils.parser_functions import parse_column, parse_date_column
 
 
 
@@ -49,7 +49,7 @@ SCHEMA_TABLE_FILE_STATS = [
 ]
 
 
-def check_files(pipeline_name:str, dataset_name: str, table_name:str, blob:str, params:dict, ingestion_date:str):
+def check_files(pipeline_name:str, dataset_name: str, table_name:str, blob:str, params:dict, ingestion_date:str, source:dict=None):
     """
     Check a blob reprensing a csv or an Excel file : check if it is readable, check if it contains the required columns defined in params.schema
     Entries :
@@ -59,6 +59,7 @@ def check_files(pipeline_name:str, dataset_name: str, table_name:str, blob:str,
     - blob                             (blob, required): Blob object
     - params                           (dict, required): Parameters containing at least : file_info {source, name, format, separator, encoding} and schema
     - ingestion_date                   (str, required) : Ingestion date of the file
+    - source                           (dict, optional): Source file of the blob to check, from landing_file_sources (decompressed blob or archive member). If NULL, the blob itself
     Return :
     - df                               df : dataframe containing the data
     - df_file_stats                    df : dataframe containing the stats of the ingested file : pipeline, source_filename, date_ingest, is_invalid, description
@@ -71,7 +72,9 @@ def check_files(pipeline_name:str, dataset_name: str, table_name:str, blob:str,
     col_to_ignore = ['source_filename', 'execution_datetime']
     col_names_to_check = schema_df[~schema_df.name.isin(col_to_ignore)].expected_file_name.to_list()
 
-    file_format = os.path.splitext(blob.name)[1].lstrip('.')
+    source = source or landing_file_sources(blob)[0]
+    source_filename = source.get('name')
+    file_format = source.get('format')
 
     if file_format == 'csv':
         print(f"file format is {file_format}")
@@ -86,29 +89,35 @@ def check_files(pipeline_name:str, dataset_name: str, table_name:str, blob:str,
     if file_format == 'json':
         print(f"file format is {file_format}")
 
-    # Read file
+    # Source which could not be listed, e.g. a corrupt or empty zip archive
+    if source.get('error'):
+        error_file = True
+        description = source.get('error')
+    elif file_format not in ['csv', 'xlsx', 'xlsm', 'json']:
+        print(f"The file '{source_filename}' has an unsupported format : {file_format}")
+        error_file = True
+        description = f'File format {file_format} is not supported'
+
+    # Read file : the cached file, or a stream decompressed while it is read
     if file_format == 'csv':
-        csv_content = blob.download_as_string()
         try:
-            df = pd.read_csv(filepath_or_buffer=io.BytesIO(csv_content), dtype=str, encoding=encoding, sep=separator)
+            df = landing_source_read(source=source, read_function=lambda content: pd.read_csv(filepath_or_buffer=content, dtype=str, encoding=encoding, sep=separator))
         except Exception as e:
-            print(f"Error when reading the CSV file :'{blob.name}' : {e}")
+            print(f"Error when reading the CSV file :'{source_filename}' : {e}")
             error_file = True
             description = f'Error when reading the CSV file : {e}'
     if file_format == 'xlsx' or file_format == 'xlsm':
-        excel_content = blob.download_as_bytes()
         try:
-            df = pd.read_excel(io=excel_content, sheet_name=sheet_name, engine='openpyxl', usecols=data_columns, skiprows=data_from_rows, dtype=str)
-        except: 
-            print(f"Error when reading the Excel file :'{blob.name}' : {e}")
+            df = landing_source_read(source=source, read_function=lambda content: pd.read_excel(io=content, sheet_name=sheet_name, engine='openpyxl', usecols=data_columns, skiprows=data_from_rows, dtype=str))
+        except Exception as e: 
+            print(f"Error when reading the Excel file :'{source_filename}' : {e}")
             error_file = True
             description = f'Error when reading the Excel file : {e}'
     if file_format == 'json':
-        json_content = blob.download_as_string()
         try : 
-            df = pd.read_json(path_or_buf=io.BytesIO(json_content))
-        except: 
-            print(f"Error when reading the JSON file :'{blob.name}' : {e}")
+            df = landing_source_read(source=source, read_function=lambda content: pd.read_json(path_or_buf=content))
+        except Exception as e: 
+            print(f"Error when reading the JSON file :'{source_filename}' : {e}")
             error_file = True
             description = f'Error when reading the JSON file : {e}'
 
@@ -117,11 +126,11 @@ def check_files(pipeline_name:str, dataset_name: str, table_name:str, blob:str,
         print("col_names_to_check", col_names_to_check)
         # Add source filename and upload the file
         if df.columns.tolist() == col_names_to_check:
-            print(f"The file '{blob.name}'  is VALID")
+            print(f"The file '{source_filename}'  is VALID")
             error_file = False 
             description = 'File is VALID'
         else:
-            print(f"The file '{blob.name}' is INVALID")
+            print(f"The file '{source_filename}' is INVALID")
             error_file = True
             description = 'Columns do not respect the columns definition'
 
@@ -129,7 +138,7 @@ def check_files(pipeline_name:str, dataset_name: str, table_name:str, blob:str,
         'pipeline': pipeline_name,
         'dataset': dataset_name,
         'table': table_name, 
-        'source_filename': blob.name,
+        'source_filename': source_filename,
         'date_ingest': ingestion_date,
         'is_invalid': error_file,
         'description': description
@@ -152,7 +161,7 @@ def check_rows_required_column(df, required_col_list):
     -------
     Returns a dataframe having lines with NULL values for columns having mode = REQUIRED
     """
-    final_df_data_invalid_REASON_REQUIRED = pd.DataFrame()
+    list_df_data_invalid_REASON_REQUIRED = []
     for col_required in required_col_list:
         df_data_invalid_REASON_REQUIRED = pd.DataFrame()
         df_data_invalid_REASON_REQUIRED = df[df[col_required].isna()]
@@ -161,8 +170,8 @@ def check_rows_required_column(df, required_col_list):
         df_data_invalid_REASON_REQUIRED['invalid_col_name'] = f'{col_required}'
         df_data_invalid_REASON_REQUIRED['invalid_col_value'] = df_data_invalid_REASON_REQUIRED[col_required]
         
-        final_df_data_invalid_REASON_REQUIRED = pd.concat([final_df_data_invalid_REASON_REQUIRED, df_data_invalid_REASON_REQUIRED])
-    return final_df_data_invalid_REASON_REQUIRED
+        list_df_data_invalid_REASON_REQUIRED.append(df_data_invalid_REASON_REQUIRED)
+    return concat_dataframes(dataframes=list_df_data_invalid_REASON_REQUIRED)
 
 
 def check_rows_key_not_unique(df, key_col_list):
@@ -213,58 +222,25 @@ def check_rows_parsing(df, schema):
     -------
     Returns a dataframe having lines with values that are not parsable into the correct type
     """
-    final_df_data_invalid_REASON_PARSING = pd.DataFrame()
-    df_copy = df.copy()
+    list_df_data_invalid_REASON_PARSING = []
     
-    for col_name, col_type, col_date_format, col_float_thousand_separator, col_float_decimal_separator in [(col_info['name'],col_info['type'],col_info['date_format'],col_info['float_thousand_separator'],col_info['float_decimal_separator'])  for col_info in schema]:
-
-        if col_type == "STRING":
-            # On met null à 0 pcq après, on va filtrer sur les nulls
-            df_copy[col_name] = df_copy[col_name].fillna('0')
-            df_copy[col_name] = df_copy[col_name].astype(str)
-        
-        if (col_type == "FLOAT64") or (col_type == "FLOAT"):
-            # On met null à 0 pcq après, on va filtrer sur les nulls
-            df_copy[col_name] = df_copy[col_name].fillna('0')
-            if col_float_thousand_separator != None:
-                df_copy[col_name] = df_copy[col_name].str.replace(col_float_thousand_separator,'')
-            if col_float_decimal_separator != None:
-                df_copy[col_name] = df_copy[col_name].str.replace(col_float_decimal_separator,'.')
-            df_copy[col_name] = pd.to_numeric(df_copy[col_name], errors='coerce', downcast="float")
-
-        if col_type == 'INTEGER':
-            # On met null à 0 pcq après, on va filtrer sur les nulls
-            df_copy[col_name] = df_copy[col_name].fillna('0')
-            
-            # On remplace les valeurs à virgules par ERROR_COMMA (en omettant le fait que ',' est en fait '.')
-            # Exemple : 10.0 n'est pas remplacé.
-            # Exemple : 10.1 est remplacé.
-            df_copy[col_name] = df_copy[col_name].str.replace(pat='^[0-9]*[.,][1-9]+$', repl="ERROR_COMMA", regex=True)
-            # On convertit en float64.
-            df_copy[col_name] = pd.to_numeric(df_copy[col_name], errors='coerce', downcast="integer")
-
-        if (col_type == 'DATE') or (col_type=='DATETIME'):
-            # On met null à 0 pcq après, on va filtrer sur les nulls
-            df_copy[col_name] = df_copy[col_name].fillna('1900-01-01')
-            # On convertit en date en respectant le format de date mentionné
-            df_copy[col_name] = pd.to_datetime(df_copy[col_name], format=col_date_format, errors='coerce')
+    for col_info in schema:
+        col_name = col_info['name']
+        col_type = col_info['type']
 
+        # Les NULL ne sont pas en erreur de parsing : ils sont filtrés par le premier check
+        _, col_failed = parse_column(values=df[col_name], col_info=col_info)
 
         # Dataframe qui contient des données non COL_TYPE pour la colonne qui doivent être du type COL_TYPE
-        df_init_test_parsed_invalid = df_copy[df_copy[col_name].isna()]
-
-        # On prend les colonnes, de sorte à identifier chaque ligne invalide.
-        df_init_test_parsed_invalid = df_init_test_parsed_invalid[['index']]
+        df_init_test_parsed_invalid = df[col_failed].copy()
         df_init_test_parsed_invalid['invalid_reason'] = f'{col_name} is not parsable to {col_type}'
         df_init_test_parsed_invalid['invalid_code'] = f'COLUMN_NOT_PARSABLE'
         df_init_test_parsed_invalid['invalid_col_name'] = f'{col_name}'
-
-        df_init_test_parsed_invalid = df_init_test_parsed_invalid.merge(df, how='left', on=['index'])
         df_init_test_parsed_invalid['invalid_col_value'] = df_init_test_parsed_invalid[col_name]
 
-        final_df_data_invalid_REASON_PARSING = pd.concat([final_df_data_invalid_REASON_PARSING, df_init_test_parsed_invalid])
+        list_df_data_invalid_REASON_PARSING.append(df_init_test_parsed_invalid)
         
-    return final_df_data_invalid_REASON_PARSING
+    return concat_dataframes(dataframes=list_df_data_invalid_REASON_PARSING)
 
 
 def check_rows(pipeline_name:str, dataset_name: str, table_name:str, filename:str, df, params:dict, ingestion_date:str):
@@ -320,9 +296,7 @@ def check_rows(pipeline_name:str, dataset_name: str, table_name:str, filename:st
 
     # Regroup invalid data REASON REQUIRED, invalid data REASON KEY NOT UNIQUE and invalid data REASON PARSING
     logging.info('Regroup invalid data REASON REQUIRED, invalid data REASON KEY NOT UNIQUE and invalid data REASON PARSING')
-    final_df_data_invalid = pd.concat([final_df_data_invalid, final_df_data_invalid_REASON_REQUIRED])
-    final_df_data_invalid = pd.concat([final_df_data_invalid, final_df_data_invalid_REASON_KEY_NOT_UNIQUE])
-    final_df_data_invalid = pd.concat([final_df_data_invalid, final_df_data_invalid_REASON_PARSING])
+    final_df_data_invalid = pd.concat([final_df_data_invalid, final_df_data_invalid_REASON_REQUIRED, final_df_data_invalid_REASON_KEY_NOT_UNIQUE, final_df_data_invalid_REASON_PARSING])
     final_df_data_invalid['date_ingest'] = ingestion_date
     final_df_data_invalid['table'] = table_name
     
@@ -375,7 +349,7 @@ def check_rows(pipeline_name:str, dataset_name: str, table_name:str, filename:st
     for idx in date_params_df.index:
         col_name = date_params_df['name'][idx]
         col_date_format = date_params_df['date_format'][idx]
-        final_df_data_valid[col_name] = pd.to_datetime(final_df_data_valid[col_name], format=col_date_format, errors='coerce')
+        final_df_data_valid[col_name], _ = parse_date_column(values=final_df_data_valid[col_name], date_format=col_date_format)
 
     return final_df_rows_stats, final_df_data_valid, final_df_data_invalid
 
@@ -395,7 +369,13 @@ def quality_validation_to_gcs(
     filename_data_invalid:str, 
     filename_data_valid:str,
     params:dict, 
-    ts:str
+    ts:str,
+    compression:str=None,
+    shard_rows:int=None,
+    write_data_valid:bool=True,
+    write_stats:bool=True,
+    shard_index:int=0,
+    shard_count:int=1
     ):
     """
     Data Quality on a list of blobs : check files & check rows. Put the result in GCS, as CSV files.
@@ -415,8 +395,14 @@ def quality_validation_to_gcs(
     - filename_data_valid              (str, required): Name of the invalid-rows file
     - params                           (dict, required): Containing at least : file_info {source, name, format, separator, encoding} and schema
     - ts                               (str, required) : Execution time
+    - compression                      (str, optional) : 'gzip' to compress the output files. If NULL, the files are not compressed.
+    - shard_rows                       (int, optional) : If set, the valid rows are written as shards {filename_data_valid}-NNNNNN of at most shard_rows rows
+    - write_data_valid                 (bool, optional) : If False, the valid rows are not staged in GCS and are only returned. Default True
+    - write_stats                      (bool, optional) : If False, the file-stats, rows-stats and invalid-rows files are not written. Default True
+    - shard_index                      (int, optional) : Index of the worker. Only the blobs owned by this shard are checked. Default 0
+    - shard_count                      (int, optional) : Number of workers the blobs are split across, by a stable hash of their name. Default 1
     Returns
-    None
+    - final_df_data_valid              df : valid rows of all the blobs
     """
 
     core_exploitation_gcs_client = storage.Client(project=core_exploitation_project_id)
@@ -424,56 +410,72 @@ def quality_validation_to_gcs(
     core_landing_gcs_client = storage.Client(project=core_landing_project_id)
     blobs = core_landing_gcs_client.list_blobs(bucket_or_name=core_landing_bucket_name, prefix=f'{core_landing_source_path}')
     df = pd.DataFrame()
-    final_df_file_stats = pd.DataFrame()
-    final_df_rows_stats = pd.DataFrame()
-    final_df_data_valid = pd.DataFrame()
-    final_df_data_invalid = pd.DataFrame()
+    # Results are collected per source file and concatenated once all the blobs are checked
+    list_df_file_stats = []
+    list_df_rows_stats = []
+    list_df_data_valid = []
+    list_df_data_invalid = []
 
     ts_datetime = datetime.datetime.strptime(ts[:19], '%Y-%m-%dT%H:%M:%S')
     ingestion_date = str(ts_datetime)
 
     for blob in blobs:
         
+        if shard_count > 1 and blob_shard_index(blob_name=blob.name, shard_count=shard_count) != shard_index:
+            continue
+
         if blob.size > 0 : # Check if a file is inside the folder
 
             print(f'======== Analyzing : {blob.name} | Size : {blob.size} | Updated : {blob.updated} | Metadata : {blob.metadata} =======')
     
-            # Get filename
-            filename = blob.name
-
-            # Check files
-            print(f'=== Check file : {blob.name} ===')
-            df, df_file_stats, error_file = check_files(pipeline_name=pipeline_name, dataset_name=dataset_name, table_name=table_name, blob=blob, params=params, ingestion_date=ingestion_date)
-            final_df_file_stats = pd.concat([final_df_file_stats, df_file_stats])
-            if error_file :
-                continue
-            else:
-                print(f'=== Check rows : {blob.name} ===')
-                rows_stats, df_data_valid, df_data_invalid = check_rows(pipeline_name=pipeline_name, dataset_name=dataset_name, table_name=table_name, filename=filename, df=df, params=params, ingestion_date=ingestion_date)
-                final_df_rows_stats = pd.concat([final_df_rows_stats, rows_stats])
-                final_df_data_valid = pd.concat([final_df_data_valid, df_data_valid])
-                final_df_data_invalid = pd.concat([final_df_data_invalid, df_data_invalid])
-                print('=== Data Quality checks done ! ===')
+            # A compressed blob is one source file, a zip archive is one source file per member
+            for source in landing_file_sources(blob=blob):
+                filename = source.get('name')
+
+                # Check files
+                print(f'=== Check file : {filename} ===')
+                df, df_file_stats, error_file = check_files(pipeline_name=pipeline_name, dataset_name=dataset_name, table_name=table_name, blob=blob, params=params, ingestion_date=ingestion_date, source=source)
+                list_df_file_stats.append(df_file_stats)
+                if error_file :
+                    continue
+                else:
+                    print(f'=== Check rows : {filename} ===')
+                    rows_stats, df_data_valid, df_data_invalid = check_rows(pipeline_name=pipeline_name, dataset_name=dataset_name, table_name=table_name, filename=filename, df=df, params=params, ingestion_date=ingestion_date)
+                    list_df_rows_stats.append(rows_stats)
+                    list_df_data_valid.append(df_data_valid)
+                    list_df_data_invalid.append(df_data_invalid)
+                    print('=== Data Quality checks done ! ===')
         else :
             continue
     
-    print(f'Write file in bucket {core_exploitation_bucket_name} from project {core_exploitation_project_id}: {core_exploitation_dq_stats_path}{filename_file_stats}.csv')
-    core_exploitation_bucket.blob(blob_name=f'{core_exploitation_dq_stats_path}{filename_file_stats}.csv').upload_from_string(data=final_df_file_stats.to_csv(sep=';', index=False), content_type='text/csv')
-
-    print(f'Write file in bucket {core_exploitation_bucket_name} from project {core_exploitation_project_id}: {core_exploitation_dq_stats_path}{filename_data_valid}.csv')
-    core_exploitation_bucket.blob(blob_name=f'{core_exploitation_dq_stats_path}{filename_data_valid}.csv').upload_from_string(data=final_df_data_valid.to_csv(sep=';', index=False), content_type='text/csv')
+    final_df_file_stats = concat_dataframes(dataframes=list_df_file_stats)
+    final_df_rows_stats = concat_dataframes(dataframes=list_df_rows_stats)
+    final_df_data_valid = concat_dataframes(dataframes=list_df_data_valid)
+    final_df_data_invalid = concat_dataframes(dataframes=list_df_data_invalid)
+
+    extension = csv_file_extension(compression=compression)
+    outputs = [(filename_file_stats, final_df_file_stats), (filename_rows_stats, final_df_rows_stats), (filename_data_invalid, final_df_data_invalid)] if write_stats else []
+    if not write_data_valid:
+        print(f'Valid rows of {table_name} are not written in bucket {core_exploitation_bucket_name}')
+    elif shard_rows:
+        # Remove the shards of a previous run, which would be caught by the wildcard load
+        gcs_delete_list_blobs(project_id=core_exploitation_project_id, bucket_name=core_exploitation_bucket_name, source_path=core_exploitation_dq_stats_path, file_prefix=f'{filename_data_valid}-')
+        print(f'Write shards in bucket {core_exploitation_bucket_name} from project {core_exploitation_project_id}: {core_exploitation_dq_stats_path}{filename_data_valid}-*{extension}')
+        gcs_upload_dataframe_csv_shards(bucket=core_exploitation_bucket, blob_name_prefix=f'{core_exploitation_dq_stats_path}{filename_data_valid}', df=final_df_data_valid, shard_rows=shard_rows, separator=';', compression=compression)
+    else:
+        outputs.append((filename_data_valid, final_df_data_valid))
 
-    print(f'Write file in bucket {core_exploitation_bucket_name} from project {core_exploitation_project_id}: {core_exploitation_dq_stats_path}{filename_rows_stats}.csv')
-    core_exploitation_bucket.blob(blob_name=f'{core_exploitation_dq_stats_path}{filename_rows_stats}.csv').upload_from_string(data=final_df_rows_stats.to_csv(sep=';', index=False), content_type='text/csv')
+    for filename_output, df_output in outputs:
+        print(f'Write file in bucket {core_exploitation_bucket_name} from project {core_exploitation_project_id}: {core_exploitation_dq_stats_path}{filename_output}{extension}')
+        gcs_upload_dataframe_csv(bucket=core_exploitation_bucket, blob_name=f'{core_exploitation_dq_stats_path}{filename_output}{extension}', df=df_output, separator=';', compression=compression)
 
-    print(f'Write file in bucket {core_exploitation_bucket_name} from project {core_exploitation_project_id}: {core_exploitation_dq_stats_path}{filename_data_invalid}.csv')
-    core_exploitation_bucket.blob(blob_name=f'{core_exploitation_dq_stats_path}{filename_data_invalid}.csv').upload_from_string(final_df_data_invalid.to_csv(sep=';', index=False), content_type='text/csv')
+    return final_df_data_valid
     
 
 def quality_stats_gcs_to_bq(
     source_project_id:str,
     source_bucket_name:str,
-    source_path:str,
+    source_path,
     filename_file_stats:str,
     filename_rows_stats:str,
     filename_data_invalid:str,
@@ -481,14 +483,16 @@ def quality_stats_gcs_to_bq(
     destination_dataset_name:str, 
     destination_table_name_file_stats:str, 
     destination_table_name_rows_stats:str, 
-    destination_table_name_data_invalid:str
+    destination_table_name_data_invalid:str,
+    compression:str=None,
+    job_id_prefix:str=None
     ):
     """
     Load data from GCS Bucket storing the data quality files to BQ Data Quality dataset
     Entries 
     - source_project_id                     (str, required) : Project id storing the data quality files
     - source_bucket_name                    (str, required) : Bucket name storing the data quality files
-    - source_path                           (str, required) : Folder path storing the data quality files
+    - source_path                           (str or list, required) : Folder path storing the data quality files, or list of the folder paths of all the workers
     - filename_file_stats                   (str, required) : Name of the file-stats file
     - filename_rows_stats                   (str, required) : Name of the rows-stats file
     - filename_data_invalid                 (str, required) : Name of the valid-rows file
@@ -497,11 +501,15 @@ def quality_stats_gcs_to_bq(
     - destination_table_name_file_stats     (str, required) : Name of the file stats table
     - destination_table_name_rows_stats     (str, required) : Name of the rows stats table
     - destination_table_name_data_invalid   (str, required) : Name of the invalid data table
+    - compression                           (str, optional) : 'gzip' if the data quality files are compressed
+    - job_id_prefix                         (str, optional) : Prefix of the deterministic load job identifiers, so that a retried run never loads a file twice
     Returns
     None
     """
-    
-    print(f'----- From project {source_project_id} and bucket {source_bucket_name}, load {source_path}{filename_file_stats}.csv to BQ {destination_project_id}.{destination_dataset_name}.{destination_table_name_file_stats} : write_mode APPEND -----')
+    extension = csv_file_extension(compression=compression)
+    source_paths = source_path if isinstance(source_path, list) else [source_path]
+
+    print(f'----- From project {source_project_id} and bucket {source_bucket_name}, load {source_path}{filename_file_stats}{extension} to BQ {destination_project_id}.{destination_dataset_name}.{destination_table_name_file_stats} : write_mode APPEND -----')
     gcs_to_bq_load(
         source_project_id=source_project_id, 
         source_bucket_name=source_bucket_name, 
@@ -510,14 +518,16 @@ def quality_stats_gcs_to_bq(
         destination_project_id=destination_project_id,
         destination_dataset_name=destination_dataset_name, 
         destination_table_name=destination_table_name_file_stats, 
-        file_info={'format':'csv'}, 
+        file_info={'format':'csv', 'compression':compression}, 
         schema=SCHEMA_TABLE_FILE_STATS, 
-        write_mode='APPEND'
+        write_mode='APPEND',
+        job_id=f'{job_id_prefix}_{destination_table_name_file_stats}' if job_id_prefix else None
     )
-    gcs_delete_list_blobs(project_id=source_project_id, bucket_name=source_bucket_name, source_path=source_path, file_prefix=f'{filename_file_stats}.csv')
+    for path in source_paths:
+        gcs_delete_list_blobs(project_id=source_project_id, bucket_name=source_bucket_name, source_path=path, file_prefix=f'{filename_file_stats}{extension}')
 
 
-    print(f'----- From project {source_project_id} and bucket {source_bucket_name}, load {source_path}{filename_rows_stats}.csv to BQ {destination_project_id}.{destination_dataset_name}.{destination_table_name_rows_stats} : write_mode APPEND -----')
+    print(f'----- From project {source_project_id} and bucket {source_bucket_name}, load {source_path}{filename_rows_stats}{extension} to BQ {destination_project_id}.{destination_dataset_name}.{destination_table_name_rows_stats} : write_mode APPEND -----')
     gcs_to_bq_load(
         source_project_id=source_project_id, 
         source_bucket_name=source_bucket_name, 
@@ -526,13 +536,15 @@ def quality_stats_gcs_to_bq(
         destination_project_id=destination_project_id,
         destination_dataset_name=destination_dataset_name, 
         destination_table_name=destination_table_name_rows_stats, 
-        file_info={'format':'csv'}, 
+        file_info={'format':'csv', 'compression':compression}, 
         schema=SCHEMA_TABLE_ROWS_STATS, 
-        write_mode='APPEND'
+        write_mode='APPEND',
+        job_id=f'{job_id_prefix}_{destination_table_name_rows_stats}' if job_id_prefix else None
     )
-    gcs_delete_list_blobs(project_id=source_project_id, bucket_name=source_bucket_name, source_path=source_path, file_prefix=f'{filename_rows_stats}.csv')
+    for path in source_paths:
+        gcs_delete_list_blobs(project_id=source_project_id, bucket_name=source_bucket_name, source_path=path, file_prefix=f'{filename_rows_stats}{extension}')
 
-    print(f'----- From project {source_project_id} and bucket {source_bucket_name}, load {source_path}{filename_data_invalid}.csv to BQ {destination_project_id}.{destination_dataset_name}.{destination_table_name_data_invalid} : write_mode APPEND -----')
+    print(f'----- From project {source_project_id} and bucket {source_bucket_name}, load {source_path}{filename_data_invalid}{extension} to BQ {destination_project_id}.{destination_dataset_name}.{destination_table_name_data_invalid} : write_mode APPEND -----')
     gcs_to_bq_load(
         source_project_id=source_project_id, 
         source_bucket_name=source_bucket_name, 
@@ -541,8 +553,10 @@ def quality_stats_gcs_to_bq(
         destination_project_id=destination_project_id,
         destination_dataset_name=destination_dataset_name, 
         destination_table_name=destination_table_name_data_invalid, 
-        file_info={'format':'csv'}, 
+        file_info={'format':'csv', 'compression':compression}, 
         schema=SCHEMA_TABLE_DATA_INVALID, 
-        write_mode='APPEND'
+        write_mode='APPEND',
+        job_id=f'{job_id_prefix}_{destination_table_name_data_invalid}' if job_id_prefix else None
     )
-    gcs_delete_list_blobs(project_id=source_project_id, bucket_name=source_bucket_name, source_path=source_path, file_prefix=f'{filename_data_invalid}.csv')
\ No newline at end of file
+    for path in source_paths:
+        gcs_delete_list_blobs(project_id=source_project_id, bucket_name=source_bucket_name, source_path=path, file_prefix=f'{filename_data_invalid}{extension}')
\ No newline at end of file
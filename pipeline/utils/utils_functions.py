@@ -1,6 +1,12 @@
 from google.cloud import storage
 import pandas as pd
+import gzip
 import io
+import os
+import zipfile
+import zlib
+from utils.cache_functions import gcs_download_cached, gcs_open_stream
+from utils.parser_functions import parse_integer_column, parse_float_column, parse_date_column
 
 
 def excel_file_to_csv_string(project_id:str, bucket_name:str, source_path:str, file_info:dict, filename:str) -> str:
@@ -22,9 +28,8 @@ def excel_file_to_csv_string(project_id:str, bucket_name:str, source_path:str, f
     data_from_rows = file_info.get('data_from_rows')
     # Get the excel file blob
     blob = bucket.blob(name=f'{source_path}{filename}.xlsx')
-    excel_content = blob.download_as_bytes()
-
-    df = pd.read_excel(io=excel_content, sheet_name=sheet_name, engine='openpyxl', usecols=data_columns, skiprows=data_from_rows, dtype=str)
+    with gcs_download_cached(blob) as excel_file:
+        df = pd.read_excel(io=excel_file, sheet_name=sheet_name, engine='openpyxl', usecols=data_columns, skiprows=data_from_rows, dtype=str)
     df = df.dropna(how='all')
     df.columns = df.columns.str.replace("\n", " ")
     csv_content = df.to_csv(path_or_buf=None, sep=";", index=False, header=True)
@@ -32,22 +37,178 @@ def excel_file_to_csv_string(project_id:str, bucket_name:str, source_path:str, f
     return csv_content
     
 
-def read_file_csv_length(blob:str, separator:str, encoding:str) -> int:
+CSV_COMPRESSIONS = [None, 'gzip']
+
+
+def csv_file_extension(compression:str=None) -> str:
+    """
+    Get the extension of a CSV file written by the pipeline
+    Entries :
+    - compression                      (str, optional): 'gzip' if the file is compressed. Other compressions are not supported
+    Return :
+    - extension                        '.csv' or '.csv.gz'
+    """
+    if compression not in CSV_COMPRESSIONS:
+        raise ValueError(f"CSV compression must be one of {CSV_COMPRESSIONS}, not '{compression}'")
+    return '.csv.gz' if compression == 'gzip' else '.csv'
+
+
+def blob_shard_index(blob_name:str, shard_count:int) -> int:
+    """
+    Get the shard owning a blob, from a stable hash of its name
+    Entries :
+    - blob_name                        (str, required): The blob name
+    - shard_count                      (int, required): The number of shards
+    Return :
+    - shard_index                      Index of the shard, between 0 and shard_count - 1
+    """
+    return zlib.crc32(blob_name.encode('utf-8')) % shard_count
+
+
+LANDING_COMPRESSIONS = {'gz': 'gzip', 'gzip': 'gzip', 'zst': 'zstd', 'zstd': 'zstd'}
+
+
+def open_decompressed(file_obj, compression:str):
+    """
+    Open a compressed file as a binary stream, decompressed while it is read. The compressed file is closed with the stream
+    Entries :
+    - file_obj                         (file, required): Binary file object of the compressed file
+    - compression                      (str, required): 'gzip' or 'zstd'
+    Return :
+    - stream                           Binary file object
+    """
+    if compression == 'gzip':
+        stream = gzip.GzipFile(fileobj=file_obj, mode='rb')
+        stream.myfileobj = file_obj # Closed by GzipFile.close, as the files opened by gzip.open
+        return stream
+    if compression == 'zstd':
+        import zstandard # Only needed for zstd landing files
+        return zstandard.ZstdDecompressor().stream_reader(file_obj, closefd=True)
+    raise ValueError(f"Compression '{compression}' is not supported")
+
+
+def open_zip_member(archive_file, member:str):
+    """
+    Open a member of a zip archive as a binary stream
+    Entries :
+    - archive_file                     (file, required): Binary file object of the zip archive
+    - member                           (str, required): The member name
+    Return :
+    - stream                           Binary file object
+    """
+    with zipfile.ZipFile(archive_file) as archive:
+        return archive.open(member)
+
+
+def landing_file_sources(blob) -> list:
+    """
+    List the source files of a landing blob : the blob itself, the decompressed content of a .gz / .zst blob, or each member of a .zip blob.
+    The blob is downloaded (through the local cache, if enabled) only when a source is opened, or listed for a .zip blob.
+    Without the cache, a .gz / .zst blob is decompressed while it is streamed from GCS. A .zip blob is fully downloaded, its members being read by seeking.
+    Entries :
+    - blob                             (blob, required): Blob object
+    Return :
+    - sources                          list of dict : name (source filename), format (csv, json, xlsx...), open (function returning a binary stream).
+                                       A .zip blob which can not be listed or has no member is a single source with an error description instead of open
+    """
+    name, extension = os.path.splitext(blob.name)
+    extension = extension.lstrip('.').lower()
+
+    if extension == 'zip':
+        archive_file = None
+        try:
+            archive_file = gcs_download_cached(blob)
+            with zipfile.ZipFile(archive_file) as archive:
+                members = [member for member in archive.namelist() if not member.endswith('/') and not member.startswith('__MACOSX/')]
+        except Exception as e:
+            if archive_file:
+                archive_file.close()
+            print(f"Error when reading the ZIP file :'{blob.name}' : {e}")
+            return [{'name': blob.name, 'format': extension, 'error': f'Error when reading the ZIP file : {e}'}]
+        if members == []:
+            archive_file.close()
+            print(f"The ZIP file '{blob.name}' has no file")
+            return [{'name': blob.name, 'format': extension, 'error': 'ZIP file has no file'}]
+        return [{
+            'name': f'{blob.name}/{member}',
+            'format': os.path.splitext(member)[1].lstrip('.').lower(),
+            'open': lambda member=member: open_zip_member(archive_file=archive_file, member=member)
+        } for member in members]
+
+    if extension in LANDING_COMPRESSIONS:
+        return [{
+            'name': blob.name,
+            'format': os.path.splitext(name)[1].lstrip('.').lower(),
+            'open': lambda: open_decompressed(file_obj=gcs_open_stream(blob), compression=LANDING_COMPRESSIONS.get(extension))
+        }]
+
+    return [{
+        'name': blob.name,
+        'format': extension,
+        'open': lambda: gcs_download_cached(blob)
+    }]
+
+
+def landing_source_read(source:dict, read_function):
+    """
+    Open a landing source file, read it and close it, even if the read fails
+    Entries :
+    - source                           (dict, required): Source file, from landing_file_sources
+    - read_function                    (function, required): Function reading the binary stream of the source, e.g. a pandas reader
+    Return :
+    - result                           The result of read_function
+    """
+    content = source.get('open')()
+    try:
+        return read_function(content)
+    finally:
+        content.close()
+
+
+def concat_dataframes(dataframes:list):
+    """
+    Concatenate a list of dataframes collected in a loop, in a single pass : concatenating at each iteration copies the accumulated rows again and again
+    Entries :
+    - dataframes                       (list, required): The dataframes to concatenate
+    Return :
+    - df                               Dataframe of all the dataframes, in the list order. Empty dataframe if the list is empty
+    """
+    return pd.concat(dataframes) if dataframes else pd.DataFrame()
+
+
+def csv_blob_has_rows(blob, compression:str=None) -> bool:
+    """
+    Check if a CSV blob has at least one line after its header, by streaming only its first lines
+    Entries :
+    - blob                             (blob, required): Blob object
+    - compression                      (str, optional): 'gzip' if the csv blob is compressed
+    Return :
+    - has_rows                         True if the blob has a line after its header
+    """
+    with blob.open(mode='rb', chunk_size=256 * 1024) as blob_file:
+        file_obj = gzip.GzipFile(fileobj=blob_file, mode='rb') if compression == 'gzip' else blob_file
+        file_obj.readline() # Header
+        return file_obj.readline().strip() != b''
+
+
+def read_file_csv_length(blob:str, separator:str, encoding:str, compression:str=None) -> int:
     """
     Get the number of rows in a dataframe
     Entries :
     - blob                             (blob, required): Blob object
     - encoding                         (str, required): The csv blob encoding
+    - compression                      (str, optional): 'gzip' if the csv blob is compressed
     Return :
     - length                           Number of rows
     """
     df = pd.DataFrame()
     length = 0    
 
-    csv_content = blob.download_as_string()
+    # Not cached : the data quality files are written again at each run
+    csv_content = blob.download_as_bytes()
 
     try:
-        df = pd.read_csv(filepath_or_buffer=io.BytesIO(csv_content), dtype=str, encoding=encoding, sep=separator)
+        df = pd.read_csv(filepath_or_buffer=io.BytesIO(csv_content), dtype=str, encoding=encoding, sep=separator, compression=compression)
         length = len(df)
     except: 
         print(f"File {blob.name} is empty or has 0 line.")
@@ -55,3 +216,34 @@ def read_file_csv_length(blob:str, separator:str, encoding:str) -> int:
     return length
 
 
+def cast_dataframe_to_schema(df, schema:list):
+    """
+    Cast the columns of a validated dataframe to the types defined in the schema, to be loaded as a typed columnar payload
+    Entries :
+    - df                               (dataframe, required): Dataframe with string values
+    - schema                           (list, required): The schema field list : name, type, date_format, float_thousand_separator, float_decimal_separator
+    Return :
+    - df                               Dataframe with typed columns
+    """
+    df = df.copy()
+    for col_info in schema:
+        col_name = col_info.get('name')
+        col_type = col_info.get('type')
+        if col_name not in df.columns:
+            continue
+
+        if col_type == 'STRING':
+            df[col_name] = df[col_name].astype('string')
+        if (col_type == 'FLOAT64') or (col_type == 'FLOAT'):
+            df[col_name], _ = parse_float_column(values=df[col_name], thousand_separator=col_info.get('float_thousand_separator'), decimal_separator=col_info.get('float_decimal_separator'))
+        if col_type == 'INTEGER':
+            # Exact Int64 values : a float64 step would change integers above 2^53
+            df[col_name], _ = parse_integer_column(values=df[col_name])
+        if col_type == 'DATE':
+            if not pd.api.types.is_datetime64_any_dtype(df[col_name]):
+                df[col_name], _ = parse_date_column(values=df[col_name], date_format=col_info.get('date_format'))
+            df[col_name] = df[col_name].dt.date
+        if col_type == 'DATETIME':
+            df[col_name], _ = parse_date_column(values=df[col_name], date_format=col_info.get('date_format'))
+
+    return df